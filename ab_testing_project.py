@@ -2,19 +2,177 @@
 """AB Testing Project
 """
 
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from scipy import stats
 from statsmodels.stats.proportion import proportions_ztest
 
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # CONFIGURATION & STYLE
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 6)
-plt.rcParams['font.size'] = 12
 COLORS = {'gate_30': '#1f77b4', 'gate_40': '#ff7f0e'}
 
+
+@lru_cache(maxsize=None)
+def _lazy_plot():
+    """Imports matplotlib/seaborn on first use (they dominate import time) and applies the style."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (12, 6)
+    plt.rcParams['font.size'] = 12
+    return plt, sns
+
+
+@lru_cache(maxsize=None)
+def _lazy_cupy():
+    """Imports CuPy on first use and returns it if a CUDA device is visible, else None.
+
+    Deferred so importing this module never initializes the CUDA driver.
+    """
+    try:
+        import cupy as cp
+        return cp if cp.cuda.runtime.getDeviceCount() > 0 else None
+    except Exception: # cupy missing, or installed without a usable CUDA driver/device
+        return None
+
+
+BOOTSTRAP_BATCH = 128 # Resamples materialized at once; caps memory at batch * n * 4 bytes
+
+
+def _resample_means(values, iterations, rng, batch=BOOTSTRAP_BATCH):
+    """Bootstrap distribution of the mean of `values` via index resampling.
+
+    Works for any numeric metric (not just 0/1). Indices are drawn with
+    `Generator.integers`, which is much cheaper than legacy `np.random.choice`, in
+    (batch, n) blocks so a full (iterations, n) matrix is never allocated.
+    """
+    n = values.size
+    integers = rng.integers
+    out = np.empty(iterations)
+    for start in range(0, iterations, batch):
+        size = min(batch, iterations - start)
+        idx = integers(0, n, size=(size, n), dtype=np.int32)
+        out[start:start + size] = values[idx].mean(axis=1)
+    return out
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _boot_diff_means_numba(control, treatment, seeds):
+        """Compiled resampling bootstrap: threads over iterations, no index matrix.
+
+        Numba keeps one RNG state per thread, so each iteration reseeds its thread's
+        state from `seeds[i]`; the result does not depend on the thread count.
+        """
+        nc, nt = control.size, treatment.size
+        iterations = seeds.size
+        out = np.empty(iterations)
+        for i in prange(iterations):
+            np.random.seed(seeds[i])
+            sum_c = 0.0
+            for _ in range(nc):
+                sum_c += control[np.random.randint(0, nc)]
+            sum_t = 0.0
+            for _ in range(nt):
+                sum_t += treatment[np.random.randint(0, nt)]
+            out[i] = sum_t / nt - sum_c / nc
+        return out
+
+
+GPU_BATCH_BYTES = 64 * 2**20 # Device memory for one batch of indices + gathered values
+
+
+def _resample_means_gpu(cp, values, iterations, seed, batch_bytes=GPU_BATCH_BYTES):
+    """CuPy version of `_resample_means`; returns a device array (no host copy).
+
+    The batch size is derived from `batch_bytes` so device memory stays bounded
+    whatever the group size.
+    """
+    rs = cp.random.RandomState(seed)
+    values = cp.asarray(values)
+    n = values.size
+    batch = max(1, batch_bytes // (n * (4 + values.itemsize))) # int32 index + gathered copy
+    out = cp.empty(iterations)
+    for start in range(0, iterations, batch):
+        size = min(batch, iterations - start)
+        idx = rs.randint(0, n, size=(size, n), dtype=cp.int32)
+        out[start:start + size] = values[idx].mean(axis=1)
+    return out
+
+
+def _bootstrap_diff_means(control, treatment, iterations, rng, use_numba=False):
+    """Bootstrap distribution of mean(treatment) - mean(control).
+
+    Runs on the GPU via CuPy when available, otherwise plain NumPy. The Numba kernel
+    is opt-in (`use_numba=True`): it uses about 2.6x the CPU time of NumPy's batched
+    gather, so it only wins with enough cores to spread that over.
+    """
+    cp = _lazy_cupy()
+    if cp is not None:
+        seed_t, seed_c = (int(s) for s in rng.integers(2**31, size=2))
+        diffs = (_resample_means_gpu(cp, treatment, iterations, seed_t)
+                 - _resample_means_gpu(cp, control, iterations, seed_c))
+        return diffs.get() # Single device -> host copy
+    if use_numba and HAS_NUMBA:
+        seeds = rng.integers(2**32, size=iterations, dtype=np.uint32) # Numba seeds are 32-bit
+        return _boot_diff_means_numba(control, treatment, seeds)
+    return _resample_means(treatment, iterations, rng) - _resample_means(control, iterations, rng)
+
+
+def _bootstrap_chunk(control, treatment, iterations, seed):
+    """Worker task: one independent chunk of bootstrap differences (must be picklable).
+
+    Always the single-threaded NumPy path: the pool already uses every core, and a
+    threaded Numba kernel or a GPU context per worker would oversubscribe the hardware.
+    """
+    rng = np.random.default_rng(seed)
+    return _resample_means(treatment, iterations, rng) - _resample_means(control, iterations, rng)
+
+
+def _parallel_bootstrap_diff_means(control, treatment, iterations, seed=42, workers=None):
+    """Spreads the resampling bootstrap over processes.
+
+    Iterations are split into one chunk per worker rather than one task per iteration,
+    so the group arrays are pickled once per worker. Each chunk gets its own child of
+    `SeedSequence(seed)`, which keeps results reproducible for a given worker count.
+    Workers are spawned, not forked: forking after Numba's threading layer has started
+    leaves a process that hangs at interpreter shutdown.
+    """
+    workers = workers or os.cpu_count() or 1
+    sizes = [len(c) for c in np.array_split(np.arange(iterations), workers) if len(c)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    boot_diffs = np.empty(iterations, dtype=np.float64)
+    with ProcessPoolExecutor(max_workers=len(sizes), mp_context=multiprocessing.get_context('spawn')) as executor:
+        chunks = executor.map(_bootstrap_chunk, [control] * len(sizes), [treatment] * len(sizes), sizes, seeds)
+        start = 0
+        for chunk in chunks:
+            boot_diffs[start:start + chunk.size] = chunk
+            start += chunk.size
+    return boot_diffs
+
+
+def _bernoulli_bootstrap_diff(k_c, n_c, k_t, n_t, iterations, rng):
+    """Bootstrap distribution of p_t - p_c for 0/1 metrics from (successes, size) counts.
+
+    The mean of a resample with replacement is Binomial(n, k/n) / n, so only the
+    counts are needed -- no per-user data is touched.
+    """
+    boot_t = rng.binomial(n_t, k_t / n_t, size=iterations) / n_t
+    boot_c = rng.binomial(n_c, k_c / n_c, size=iterations) / n_c
+    return boot_t - boot_c # Treatment - Control
+
 class CookieCatsABTest:
     """
     Professional A/B Test Analysis for the Cookie Cats Mobile Game.
@@ -25,10 +183,12 @@ class CookieCatsABTest:
     - Goal: Analyze impact on Player Retention (1-day & 7-day) and Engagement (Game Rounds).
     """
 
-    def __init__(self, filepath='cookie_cats.csv'):
+    def __init__(self, filepath='cookie_cats.csv', plot=True):
         self.filepath = filepath
+        self.plot = plot # Set False for headless / batch / benchmark runs (plotting libs never load)
         self.df = None
         self.cleaned_df = None
+        self._is_treatment = None # Boolean row mask for gate_40, built once in data_cleaning
         self.results = {}
 
     def load_data(self):
@@ -44,38 +204,37 @@ class CookieCatsABTest:
             print("WARNING: 'cookie_cats.csv' not found. Generating REALISTIC SYNTHETIC data for demonstration...")
             self.df = self._generate_synthetic_data()
 
+        # Two-level label: categorical codes make masks and groupbys integer compares
+        self.df['version'] = self.df['version'].astype('category')
+
         print(f"Data Shape: {self.df.shape}")
         print(f"Columns: {self.df.columns.tolist()}")
         return self.df
 
     def _generate_synthetic_data(self):
         """Generates mock data with the same skew and properties as the real Kaggle dataset."""
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         n = 90189
 
         # 50/50 split roughly
-        versions = np.random.choice(['gate_30', 'gate_40'], size=n, p=[0.495, 0.505])
+        versions = rng.choice(['gate_30', 'gate_40'], size=n, p=[0.495, 0.505])
 
         # Game rounds (Negative Binomial distribution to mimic right-skewed engagement)
-        rounds = np.random.negative_binomial(n=1, p=0.02, size=n)
+        rounds = rng.negative_binomial(n=1, p=0.02, size=n)
 
         # Retention logic: correlated with rounds
         # Higher rounds = higher chance of retention, but gate_40 has slightly lower retention
-        retention_1 = []
-        retention_7 = []
+        # Base probability increases with rounds played
+        base_prob_1 = np.minimum(0.85, 0.1 + rounds / 50)
+        base_prob_7 = np.minimum(0.60, 0.05 + rounds / 100)
 
-        for v, r in zip(versions, rounds):
-            # Base probability increases with rounds played
-            base_prob_1 = min(0.85, 0.1 + (r / 50))
-            base_prob_7 = min(0.60, 0.05 + (r / 100))
+        # Simulated Treatment Effect: Gate 40 hurts retention slightly
+        is_gate_40 = versions == 'gate_40'
+        base_prob_1[is_gate_40] *= 0.99  # 1% drop
+        base_prob_7[is_gate_40] *= 0.96  # 4% drop
 
-            # Simulated Treatment Effect: Gate 40 hurts retention slightly
-            if v == 'gate_40':
-                base_prob_1 *= 0.99  # 1% drop
-                base_prob_7 *= 0.96  # 4% drop
-
-            retention_1.append(np.random.random() < base_prob_1)
-            retention_7.append(np.random.random() < base_prob_7)
+        retention_1 = rng.random(n) < base_prob_1
+        retention_7 = rng.random(n) < base_prob_7
 
         df = pd.DataFrame({
             'userid': range(10000, 10000 + n),
@@ -100,10 +259,10 @@ class CookieCatsABTest:
 
         # Chi-square goodness of fit
         # Null Hypothesis: Split is 50/50
-        observed = group_counts.values
-        expected = [sum(observed)/2, sum(observed)/2]
-
-        chi2, p_value = stats.chisquare(observed, f_exp=expected)
+        # With two cells and equal expected counts the statistic reduces to (n1 - n2)^2 / (n1 + n2)
+        n1, n2 = group_counts.values
+        chi2 = (n1 - n2) ** 2 / (n1 + n2)
+        p_value = stats.chi2.sf(chi2, df=1)
         print(f"SRM Test p-value: {p_value:.4f}")
 
         if p_value < 0.01:
@@ -127,45 +286,100 @@ class CookieCatsABTest:
         else:
             self.cleaned_df = self.df.copy()
 
+        # Compact numeric dtypes: 0/1 flags as uint8, rounds as int32 (contiguous, SIMD-friendly)
+        self.cleaned_df = self.cleaned_df.astype({
+            'retention_1': 'uint8',
+            'retention_7': 'uint8',
+            'sum_gamerounds': 'int32'
+        })
+
         print(f"Cleaned Data Shape: {self.cleaned_df.shape}")
 
+        # Split once; every later analysis reuses this mask instead of re-comparing strings
+        self._is_treatment = (self.cleaned_df['version'] == 'gate_40').to_numpy()
+
         # Plot distribution (zoomed in)
-        plt.figure(figsize=(10, 5))
-        sns.boxplot(data=self.cleaned_df, x='version', y='sum_gamerounds', palette=COLORS)
-        plt.title('Distribution of Game Rounds (Outlier Removed)')
-        plt.yscale('log') # Log scale to see the spread better
-        plt.ylabel('Game Rounds (Log Scale)')
-        plt.tight_layout()
-        plt.show()
-
-    def analyze_retention(self):
+        if self.plot:
+            plt, sns = _lazy_plot()
+            plt.figure(figsize=(10, 5))
+            sns.boxplot(data=self.cleaned_df, x='version', y='sum_gamerounds', palette=COLORS)
+            plt.title('Distribution of Game Rounds (Outlier Removed)')
+            plt.yscale('log') # Log scale to see the spread better
+            plt.ylabel('Game Rounds (Log Scale)')
+            plt.tight_layout()
+            plt.show()
+
+    def analyze_retention(self, method='bootstrap', workers=1, use_numba=False):
         """
-        Analyzes 1-Day and 7-Day retention using Bootstrap Analysis.
+        Analyzes 1-Day and 7-Day retention with a Bootstrap or a closed-form (analytic) comparison.
         Why Bootstrap? It's robust, intuitive, and handles the non-normality of the data well.
+        The analytic mode gives the same answer instantly at this sample size.
+
+        method:
+        - 'bootstrap': Bernoulli shortcut (binomial draws), the fast default.
+        - 'resample': classic index resampling, valid for non-binary metrics too.
+        - 'analytic': closed-form normal approximation for two proportions (no sampling).
+
+        workers: processes used by 'resample' (1 = in-process, None = all cores). Workers
+        are spawned, so scripts calling this must use an `if __name__ == "__main__":` guard.
+        use_numba: run in-process 'resample' on the threaded Numba kernel (if installed).
         """
-        print("\n--- 3. RETENTION ANALYSIS (Bootstrap) ---")
+        if method not in ('bootstrap', 'resample', 'analytic'):
+            raise ValueError(f"Unknown method '{method}'. Use 'bootstrap', 'resample' or 'analytic'.")
 
-        for metric in ['retention_1', 'retention_7']:
+        title = 'Analytic' if method == 'analytic' else 'Bootstrap'
+        print(f"\n--- 3. RETENTION ANALYSIS ({title}) ---")
+
+        metrics = ['retention_1', 'retention_7']
+        iterations = 1000 # Industry standard for quick insights (use 10k for final)
+        if method == 'resample':
+            # Only the resampling path needs per-user rows; split masks once for all metrics
+            is_treatment = self._is_treatment
+            is_control = ~is_treatment
+
+        # (successes, size) per group for every metric in one groupby pass
+        counts_all = self.cleaned_df.groupby('version', observed=True)[metrics].agg(['sum', 'size'])
+
+        for metric in metrics:
             print(f"\nAnalyzing {metric}...")
 
-            # Calculate base rates
-            rates = self.cleaned_df.groupby('version')[metric].mean()
+            # Calculate base rates from (successes, size) per group
+            counts = counts_all[metric].astype('int64') # Row lookups below stay integer trial counts
+            rates = (counts['sum'] / counts['size']).rename(metric)
             print(f"Observed Conversion Rates:\n{rates}")
 
-            # Bootstrap Probabilities
-            # We resample with replacement to build a distribution of means
-            iterations = 1000 # Industry standard for quick insights (use 10k for final)
-            boot_diffs = []
+            k_c, n_c = counts.loc['gate_30']
+            k_t, n_t = counts.loc['gate_40']
 
-            control = self.cleaned_df[self.cleaned_df['version'] == 'gate_30'][metric].values
-            treatment = self.cleaned_df[self.cleaned_df['version'] == 'gate_40'][metric].values
+            if method == 'analytic':
+                # Wald interval on p_t - p_c; the bootstrap converges to this for large n
+                p_c, p_t = k_c / n_c, k_t / n_t
+                diff = p_t - p_c
+                se = np.sqrt(p_c * (1 - p_c) / n_c + p_t * (1 - p_t) / n_t)
+                prob_loss = stats.norm.cdf(0, loc=diff, scale=se) # P(Diff < 0)
+                ci_low, ci_high = diff - 1.96 * se, diff + 1.96 * se
+                _, p_value = proportions_ztest([k_t, k_c], [n_t, n_c])
 
-            for _ in range(iterations):
-                boot_c = np.mean(np.random.choice(control, size=len(control), replace=True))
-                boot_t = np.mean(np.random.choice(treatment, size=len(treatment), replace=True))
-                boot_diffs.append(boot_t - boot_c) # Treatment - Control
+                print(f"Difference (Gate 40 - Gate 30): {diff:.4f} (95% CI: [{ci_low:.4f}, {ci_high:.4f}])")
+                print(f"Z-test p-value: {p_value:.5f}")
+                print(f"Probability that Gate 40 is WORSE than Gate 30: {prob_loss:.2%}")
+                continue
 
-            boot_diffs = np.array(boot_diffs)
+            # Bootstrap Probabilities
+            rng = np.random.default_rng(42)
+
+            if method == 'resample':
+                values = self.cleaned_df[metric].to_numpy()
+                control, treatment = values[is_control], values[is_treatment]
+                if workers == 1:
+                    boot_diffs = _bootstrap_diff_means(control, treatment, iterations, rng, use_numba=use_numba)
+                else:
+                    boot_diffs = _parallel_bootstrap_diff_means(control, treatment, iterations, workers=workers)
+            else:
+                # The metric is Bernoulli (0/1), so the mean of a resample with replacement
+                # is distributed as Binomial(n, p_hat) / n. Drawing that directly gives the
+                # same bootstrap distribution without materializing any resamples.
+                boot_diffs = _bernoulli_bootstrap_diff(k_c, n_c, k_t, n_t, iterations, rng)
 
             # Calculate Probability of Treatment being worse than Control
             # (Since we suspect gate_40 is bad, we check if Diff < 0)
@@ -174,12 +388,14 @@ class CookieCatsABTest:
             print(f"Probability that Gate 40 is WORSE than Gate 30: {prob_loss:.2%}")
 
             # Plot Bootstrap Distribution
-            plt.figure(figsize=(10, 4))
-            sns.histplot(boot_diffs, kde=True, color='purple')
-            plt.axvline(0, color='red', linestyle='--')
-            plt.title(f'Bootstrap Difference in Means ({metric})\n(Values < 0 favor Gate 30)')
-            plt.xlabel('Difference (Gate 40 - Gate 30)')
-            plt.show()
+            if self.plot:
+                plt, sns = _lazy_plot()
+                plt.figure(figsize=(10, 4))
+                sns.histplot(boot_diffs, kde=True, color='purple')
+                plt.axvline(0, color='red', linestyle='--')
+                plt.title(f'Bootstrap Difference in Means ({metric})\n(Values < 0 favor Gate 30)')
+                plt.xlabel('Difference (Gate 40 - Gate 30)')
+                plt.show()
 
     def analyze_gamerounds(self):
         """
@@ -188,8 +404,8 @@ class CookieCatsABTest:
         """
         print("\n--- 4. ENGAGEMENT ANALYSIS (Mann-Whitney U) ---")
 
-        control = self.cleaned_df[self.cleaned_df['version'] == 'gate_30']['sum_gamerounds']
-        treatment = self.cleaned_df[self.cleaned_df['version'] == 'gate_40']['sum_gamerounds']
+        rounds = self.cleaned_df['sum_gamerounds'].to_numpy()
+        control, treatment = rounds[~self._is_treatment], rounds[self._is_treatment]
 
         # Mann-Whitney U Test
         u_stat, p_val = stats.mannwhitneyu(control, treatment)